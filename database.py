@@ -1,42 +1,163 @@
 import sqlite3
 from typing import Optional, Dict, Any, List
 from datetime import datetime
-import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import orjson
+import os
+import queue
+import time
 import uuid
 import threading
 
+# Store datetimes as "YYYY-MM-DD HH:MM:SS.ffffff" - the same text the default
+# adapter writes, registered explicitly because that adapter is deprecated
+# since Python 3.12. Unlike CURRENT_TIMESTAMP it keeps microseconds, so rows
+# created within the same second still sort by created_at.
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+def new_id() -> str:
+    """Time-ordered UUIDv7 string for primary keys.
+
+    The leading 48 bits are the Unix time in milliseconds, so new rows land
+    near the right edge of the primary key index instead of on random pages.
+    The remaining bits are random: ids from the same millisecond are not
+    ordered among themselves.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (
+        (timestamp_ms & 0xFFFFFFFFFFFF) << 80
+        | 0x7 << 76                       # version 7
+        | (rand >> 62 & 0xFFF) << 64      # rand_a
+        | 0x2 << 62                       # RFC 4122 variant
+        | rand & 0x3FFFFFFFFFFFFFFF       # rand_b
+    )
+    return str(uuid.UUID(int=value))
+
 class DatabaseService:
-    """Simple synchronous database service that works reliably"""
+    """Simple database service - sqlite3 calls run in worker threads"""
     
-    def __init__(self, database_url: str = "leads.db"):
+    def __init__(self, database_url: str = "leads.db", pool_size: int = 4):
         self.database_url = database_url
         self._initialized = False
         self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="db")
+        # Reused connections keep their page cache and prepared statements;
+        # LIFO hands out the most recently used (warmest) one first
+        self._pool = queue.LifoQueue(maxsize=pool_size)
     
     def get_connection(self):
-        """Get a connection with proper settings"""
-        conn = sqlite3.connect(self.database_url, check_same_thread=False)
+        """Open a new connection with proper settings"""
+        conn = sqlite3.connect(self.database_url, check_same_thread=False, cached_statements=256)
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB memory-mapped reads
         return conn
     
-    def execute_query(self, query: str, params: tuple = (), fetch: str = None):
+    @contextmanager
+    def borrow_connection(self):
+        """Borrow a pooled connection, returning it to the pool when done"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            # Never hand a connection with a half-finished transaction to the next caller
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def close(self):
+        """Close every pooled connection.
+
+        The executor is left running: db_service is a module-level singleton,
+        and the next startup in the same process borrows fresh connections
+        through it.
+        """
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+    
+    def _execute_query_sync(self, query: str, params: tuple = (), fetch: str = None):
         """Execute query synchronously"""
-        with self._lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                
-                if fetch == 'one':
-                    result = cursor.fetchone()
-                    return dict(result) if result else None
-                elif fetch == 'all':
-                    return [dict(row) for row in cursor.fetchall()]
-                else:
+        if fetch is None:
+            # Writes are serialized in-process; SQLite allows one writer at a time
+            with self._lock:
+                with self.borrow_connection() as conn:
+                    cursor = conn.execute(query, params)
                     conn.commit()
                     return cursor.rowcount
+        
+        # Reads run concurrently, each on its own pooled connection under WAL
+        with self.borrow_connection() as conn:
+            cursor = conn.cursor()
+            # Plain tuples zipped against the column names read once per
+            # query are cheaper than building each dict from a sqlite3.Row
+            cursor.row_factory = None
+            cursor.execute(query, params)
+            
+            if fetch == 'one':
+                result = cursor.fetchone()
+                if result is None:
+                    return None
+                return dict(zip([col[0] for col in cursor.description], result))
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
     
-    def init_database(self):
-        """Initialize database synchronously"""
+    async def execute_query(self, query: str, params: tuple = (), fetch: str = None):
+        """Execute query in a worker thread so the event loop is never blocked"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self._execute_query_sync, query, params, fetch
+        )
+    
+    def _execute_transaction_sync(self, statements: List[tuple]):
+        """Execute several write statements atomically, with a single commit"""
+        with self._lock:
+            # The connection context manager commits on success and rolls back on error.
+            # BEGIN is explicit because sqlite3 only opens one implicitly before DML.
+            with self.borrow_connection() as conn, conn:
+                conn.execute('BEGIN')
+                for query, params in statements:
+                    conn.execute(query, params)
+    
+    async def execute_transaction(self, statements: List[tuple]):
+        """Execute (query, params) pairs in one transaction in a worker thread"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.executor, self._execute_transaction_sync, statements
+        )
+    
+    def _execute_many_sync(self, query: str, rows: List[tuple], statements: List[tuple] = ()):
+        """Run one statement over many parameter rows, plus follow-ups, in one transaction"""
+        with self._lock:
+            with self.borrow_connection() as conn, conn:
+                conn.execute('BEGIN')
+                conn.executemany(query, rows)
+                for follow_up, params in statements:
+                    conn.execute(follow_up, params)
+    
+    async def execute_many(self, query: str, rows: List[tuple], statements: List[tuple] = ()):
+        """Bulk-execute query with executemany in a worker thread, with a single commit"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.executor, self._execute_many_sync, query, rows, statements
+        )
+    
+    async def init_database(self):
+        """Initialize database"""
         if self._initialized:
             return
             
@@ -125,21 +246,22 @@ class DatabaseService:
         # Create indexes
         indexes = [
             'CREATE INDEX IF NOT EXISTS idx_leads_customer_id ON leads(customer_id)',
+            'CREATE INDEX IF NOT EXISTS idx_leads_customer_created ON leads(customer_id, created_at DESC)',
+            # Partial index: answers the dashboard's qualified-lead COUNT from hot/warm rows only
+            "CREATE INDEX IF NOT EXISTS idx_leads_customer_stage ON leads(customer_id, qualification_stage) WHERE qualification_stage IN ('hot_lead', 'warm_lead')",
             'CREATE INDEX IF NOT EXISTS idx_leads_email ON leads(email)',
             'CREATE INDEX IF NOT EXISTS idx_customers_api_key ON customers(api_key)',
-            'CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(email)'
+            'CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(email)',
+            'CREATE INDEX IF NOT EXISTS idx_webhooks_customer_active ON zapier_webhooks(customer_id) WHERE active = TRUE'
         ]
         
         try:
-            # Execute all table creation
-            for i, table_sql in enumerate(tables):
-                self.execute_query(table_sql)
-                print(f"✅ Created table {i+1}/{len(tables)}")
-            
-            # Create indexes
-            for i, index_sql in enumerate(indexes):
-                self.execute_query(index_sql)
-                print(f"✅ Created index {i+1}/{len(indexes)}")
+            # Tables, indexes and planner statistics (so the new indexes get
+            # picked up) all go through one transaction with a single commit
+            await self.execute_transaction(
+                [(sql, ()) for sql in tables + indexes] + [('ANALYZE', ())]
+            )
+            print(f"✅ Created {len(tables)} tables and {len(indexes)} indexes")
             
             self._initialized = True
             print("✅ Database initialized successfully")
@@ -148,15 +270,16 @@ class DatabaseService:
             print(f"❌ Database initialization error: {e}")
             raise
     
-    # Wrapper methods to make them async-compatible
+    # Kept for callers of the old explicit async wrapper
     async def async_execute_query(self, query: str, params: tuple = (), fetch: str = None):
         """Async wrapper for execute_query"""
-        return self.execute_query(query, params, fetch)
+        return await self.execute_query(query, params, fetch)
     
     async def create_customer(self, customer_data: Dict[str, Any]) -> str:
         """Create a new customer"""
-        customer_id = str(uuid.uuid4())
-        self.execute_query('''
+        customer_id = new_id()
+        now = datetime.now()
+        await self.execute_query('''
             INSERT INTO customers (
                 id, email, stripe_customer_id, stripe_subscription_id, 
                 plan, api_key, leads_limit, status, created_at, updated_at
@@ -165,13 +288,13 @@ class DatabaseService:
             customer_id, customer_data['email'], customer_data.get('stripe_customer_id'),
             customer_data.get('stripe_subscription_id'), customer_data['plan'],
             customer_data['api_key'], customer_data['leads_limit'], 'active',
-            datetime.now(), datetime.now()
+            now, now
         ))
         return customer_id
     
     async def get_customer_by_api_key(self, api_key: str) -> Optional[Dict[str, Any]]:
         """Get customer by API key"""
-        return self.execute_query(
+        return await self.execute_query(
             "SELECT * FROM customers WHERE api_key = ? AND status = 'active'",
             (api_key,),
             fetch='one'
@@ -179,8 +302,9 @@ class DatabaseService:
     
     async def create_lead(self, lead_data: Dict[str, Any]) -> str:
         """Create a new lead"""
-        lead_id = str(uuid.uuid4())
-        self.execute_query('''
+        lead_id = new_id()
+        now = datetime.now()
+        await self.execute_query('''
             INSERT INTO leads (
                 id, customer_id, email, first_name, last_name, 
                 company, phone, source, created_at, updated_at
@@ -189,20 +313,20 @@ class DatabaseService:
             lead_id, lead_data['customer_id'], lead_data['email'],
             lead_data.get('first_name'), lead_data.get('last_name'),
             lead_data.get('company'), lead_data.get('phone'),
-            lead_data.get('source', 'api'), datetime.now(), datetime.now()
+            lead_data.get('source', 'api'), now, now
         ))
         return lead_id
     
     async def get_leads(self, customer_id: str, skip: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
         """Get leads for a customer"""
-        return self.execute_query('''
+        return await self.execute_query('''
             SELECT * FROM leads WHERE customer_id = ?
             ORDER BY created_at DESC LIMIT ? OFFSET ?
         ''', (customer_id, limit, skip), fetch='all') or []
     
     async def update_customer_usage(self, customer_id: str):
         """Increment customer's lead usage counter"""
-        self.execute_query('''
+        await self.execute_query('''
             UPDATE customers 
             SET leads_used_this_month = leads_used_this_month + 1, updated_at = ?
             WHERE id = ?
@@ -210,7 +334,7 @@ class DatabaseService:
     
     async def set_customer_password(self, api_key: str, password_hash: str):
         """Set customer password hash"""
-        self.execute_query('''
+        await self.execute_query('''
             UPDATE customers 
             SET password_hash = ?, updated_at = ?
             WHERE api_key = ?
@@ -218,12 +342,12 @@ class DatabaseService:
     
     async def log_analytics_event(self, customer_id: str, event_type: str, data: Dict[str, Any]):
         """Log an analytics event"""
-        self.execute_query('''
+        await self.execute_query('''
             INSERT INTO analytics (id, customer_id, event_type, data, timestamp)
             VALUES (?, ?, ?, ?, ?)
         ''', (
-            str(uuid.uuid4()), customer_id, event_type, 
-            json.dumps(data), datetime.now()
+            new_id(), customer_id, event_type, 
+            orjson.dumps(data).decode(), datetime.now()
         ))
 
 # Global instance
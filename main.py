@@ -1,8 +1,10 @@
 # main.py - Clean modular entry point
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import uvicorn
+import orjson
 import os
 
 # Import configuration and services
@@ -23,12 +25,14 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🔄 Application shutting down")
+    db_service.close()
 
 # Create FastAPI app
 app = FastAPI(
     title="AI Lead Robot - Modular",
     description="Efficient lead qualification with Zapier integration",
     version="2.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -39,6 +43,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,  # Let browsers reuse preflight results for a day
 )
 
 # Include all routers
@@ -52,9 +57,13 @@ app.include_router(webhooks.router)
 async def home():
     return {"message": "AI Lead Robot API", "version": "2.0.0", "docs": "/docs"}
 
+# Health payload never changes at runtime - serialize it once at import.
+# A fresh Response wraps the shared bytes because middleware mutates headers.
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "version": "2.0.0"})
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "version": "2.0.0"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8000)))
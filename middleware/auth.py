@@ -13,14 +13,14 @@ class AuthMiddleware(BaseHTTPMiddleware):
         start_time = time.time()
         
         # Log request
-        logger.info(f"Request: {request.method} {request.url.path}")
+        logger.info("Request: %s %s", request.method, request.url.path)
         
         # Process request
         response = await call_next(request)
         
         # Log response time
         process_time = time.time() - start_time
-        logger.info(f"Response time: {process_time:.3f}s")
+        logger.info("Response time: %.3fs", process_time)
         
         return response
 
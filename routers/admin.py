@@ -313,7 +313,7 @@ async def update_customer_admin(
     admin: dict = Depends(get_current_admin)
 ):
     """Update customer information"""
-    success = await admin_service.update_customer(customer_id, update.dict(exclude_unset=True))
+    success = await admin_service.update_customer(customer_id, update.model_dump(exclude_unset=True))
     if success:
         return {"message": "Customer updated successfully"}
     else:
@@ -1,18 +1,33 @@
 # At the top of routers/leads.py, add these imports:
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from typing import List
-import uuid
+import asyncio
+import html
 from datetime import datetime
 
 # Import your new services
 from services.auth_service import get_current_customer
 from services.webhook_service import zapier_service
 from services.email_service import email_service
-from database import db_service
+from database import db_service, new_id
 from models import LeadInput
 
 router = APIRouter(prefix="/api/leads", tags=["leads"])
 
+# Largest import accepted by the bulk endpoint in one request
+BULK_LEADS_MAX = 5000
+# Concurrent Zapier deliveries for one bulk import - keeps half of the Zapier
+# service's 4 worker threads free for single-lead deliveries
+BULK_ZAPIER_CONCURRENCY = 2
+
+_INSERT_LEAD_SQL = '''
+    INSERT INTO leads (
+        id, customer_id, email, first_name, last_name, 
+        company, phone, source, created_at, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_BUMP_USAGE_SQL = "UPDATE customers SET leads_used_this_month = leads_used_this_month + ? WHERE id = ?"
+
 # Update your existing create_lead function to use the new services
 @router.post("/", response_model=dict)
 async def create_lead(
@@ -26,30 +41,23 @@ async def create_lead(
     if customer['leads_used_this_month'] >= customer['leads_limit']:
         raise HTTPException(status_code=429, detail="Monthly limit exceeded")
     
-    # Create lead
-    lead_id = str(uuid.uuid4())
-    lead_data = lead.dict()
+    # Create lead - one timestamp shared by the row and the Zapier payload
+    now = datetime.now()
+    lead_id = new_id()
+    lead_data = lead.model_dump()
     lead_data['id'] = lead_id
     lead_data['customer_id'] = customer['id']
-    lead_data['created_at'] = datetime.now().isoformat()
-    
-    # Save to database
-    await db_service.execute_query('''
-        INSERT INTO leads (
-            id, customer_id, email, first_name, last_name, 
-            company, phone, source, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        lead_id, customer['id'], lead.email, lead.first_name, 
-        lead.last_name, lead.company, lead.phone, lead.source, 
-        datetime.now(), datetime.now()
-    ))
+    lead_data['created_at'] = now.isoformat()
     
-    # Update usage counter
-    await db_service.execute_query(
-        "UPDATE customers SET leads_used_this_month = leads_used_this_month + 1 WHERE id = ?",
-        (customer['id'],)
-    )
+    # Save the lead and bump the usage counter in one transaction (one commit)
+    await db_service.execute_transaction([
+        (_INSERT_LEAD_SQL, (
+            lead_id, customer['id'], lead.email, lead.first_name, 
+            lead.last_name, lead.company, lead.phone, lead.source, 
+            now, now
+        )),
+        (_BUMP_USAGE_SQL, (1, customer['id'])),
+    ])
     
     # Background tasks for async processing
     background_tasks.add_task(send_to_zapier_async, customer['id'], lead_data)
@@ -65,12 +73,85 @@ async def create_lead(
         }
     }
 
+@router.post("/bulk", response_model=dict)
+async def create_leads_bulk(
+    leads: List[LeadInput],
+    background_tasks: BackgroundTasks,
+    customer: dict = Depends(get_current_customer)
+):
+    """Import many leads at once with a single insert batch and commit"""
+    
+    if not leads:
+        raise HTTPException(status_code=400, detail="No leads provided")
+    
+    if len(leads) > BULK_LEADS_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_LEADS_MAX} leads per request")
+    
+    # The whole batch must fit in what is left of this month's allowance
+    if customer['leads_used_this_month'] + len(leads) > customer['leads_limit']:
+        raise HTTPException(status_code=429, detail="Monthly limit exceeded")
+    
+    now = datetime.now()
+    created_at = now.isoformat()
+    rows = []
+    leads_data = []
+    for lead in leads:
+        lead_id = new_id()
+        rows.append((
+            lead_id, customer['id'], lead.email, lead.first_name,
+            lead.last_name, lead.company, lead.phone, lead.source,
+            now, now
+        ))
+        lead_data = lead.model_dump()
+        lead_data['id'] = lead_id
+        lead_data['customer_id'] = customer['id']
+        lead_data['created_at'] = created_at
+        leads_data.append(lead_data)
+    
+    # One executemany over the batch and one usage update, committed together
+    await db_service.execute_many(
+        _INSERT_LEAD_SQL, rows, [(_BUMP_USAGE_SQL, (len(rows), customer['id']))]
+    )
+    
+    background_tasks.add_task(send_leads_to_zapier_async, customer['id'], leads_data)
+    
+    return {
+        "lead_ids": [row[0] for row in rows],
+        "status": "created",
+        "message": f"{len(rows)} leads captured and sent to Zapier!",
+        "usage": {
+            "used": customer['leads_used_this_month'] + len(rows),
+            "limit": customer['leads_limit']
+        }
+    }
+
 async def send_to_zapier_async(customer_id: str, lead_data: dict):
     """Background task to send to Zapier"""
-    async with zapier_service:
-        webhooks = await zapier_service.get_customer_webhooks(customer_id)
-        for webhook in webhooks:
-            await zapier_service.send_to_zapier(webhook['webhook_url'], lead_data)
+    webhooks = await zapier_service.get_customer_webhooks(customer_id)
+    # Deliver to every configured webhook concurrently rather than one after another
+    await asyncio.gather(*(
+        zapier_service.send_to_zapier(webhook['webhook_url'], lead_data)
+        for webhook in webhooks
+    ))
+
+async def send_leads_to_zapier_async(customer_id: str, leads_data: List[dict]):
+    """Background task to send an imported batch to Zapier"""
+    # Look the webhooks up once for the whole batch
+    webhooks = await zapier_service.get_customer_webhooks(customer_id)
+    if not webhooks:
+        return
+    
+    semaphore = asyncio.Semaphore(BULK_ZAPIER_CONCURRENCY)
+    
+    async def deliver(webhook_url: str, lead_data: dict):
+        async with semaphore:
+            await zapier_service.send_to_zapier(webhook_url, lead_data)
+    
+    await asyncio.gather(*(
+        deliver(webhook['webhook_url'], lead_data)
+        for lead_data in leads_data
+        for webhook in webhooks
+    ))
 
 async def send_welcome_email_async(email: str, first_name: str):
     """Background task for email"""
@@ -78,7 +159,7 @@ async def send_welcome_email_async(email: str, first_name: str):
         subject = f"Thanks for your interest, {first_name}!"
         content = f"""
         <div style="font-family: Arial; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <h2>Hi {first_name}!</h2>
+            <h2>Hi {html.escape(first_name)}!</h2>
             <p>Thanks for your interest! We'd love to learn more about your needs.</p>
             <p><strong>Quick question:</strong> What's your biggest challenge right now?</p>
             <p>Just reply to this email and let us know!</p>
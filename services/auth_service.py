@@ -28,7 +28,8 @@ class AuthService:
     async def verify_api_key(self, api_key: str) -> Optional[Dict[str, Any]]:
         """Verify API key and return customer info"""
         customer = await db_service.execute_query(
-            "SELECT * FROM customers WHERE api_key = ? AND status = 'active'",
+            """SELECT id, email, plan, api_key, leads_limit, leads_used_this_month
+               FROM customers WHERE api_key = ? AND status = 'active'""",
             (api_key,),
             fetch='one'
         )
@@ -37,7 +38,7 @@ class AuthService:
     async def authenticate_customer(self, email: str, password: str) -> Optional[Dict[str, Any]]:
         """Authenticate customer with email and password"""
         customer = await db_service.execute_query(
-            "SELECT * FROM customers WHERE email = ? AND status = 'active'",
+            "SELECT id, api_key, password_hash FROM customers WHERE email = ? AND status = 'active'",
             (email,),
             fetch='one'
         )
@@ -1,7 +1,14 @@
 import asyncio
 from typing import Optional
 import logging
-from config import settings
+from config import settings, PRICING_PLANS
+
+# Resolved once at import rather than on every send
+try:
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Mail
+except ImportError:
+    SendGridAPIClient = Mail = None
 
 logger = logging.getLogger(__name__)
 
@@ -11,11 +18,10 @@ class EmailService:
     def __init__(self):
         self.client = None
         if settings.sendgrid_api_key:
-            try:
-                from sendgrid import SendGridAPIClient
+            if SendGridAPIClient is not None:
                 self.client = SendGridAPIClient(api_key=settings.sendgrid_api_key)
                 print("✅ SendGrid initialized")
-            except ImportError:
+            else:
                 print("⚠️ SendGrid package not installed")
         else:
             print("⚠️ SendGrid API key not configured")
@@ -27,8 +33,6 @@ class EmailService:
             return False
         
         try:
-            from sendgrid.helpers.mail import Mail
-            
             message = Mail(
                 from_email=settings.from_email,
                 to_emails=to_email,
@@ -42,7 +46,7 @@ class EmailService:
                 None, self.client.send, message
             )
             
-            logger.info(f"✅ Email sent to {to_email}")
+            logger.info("✅ Email sent to %s", to_email)
             return True
             
         except Exception as e:
@@ -51,8 +55,6 @@ class EmailService:
     
     async def send_welcome_email(self, customer_email: str, plan: str, api_key: str) -> bool:
         """Send welcome email to new customers"""
-        from config import PRICING_PLANS
-        
         plan_info = PRICING_PLANS[plan]
         subject = "🎉 Welcome to AI Lead Robot - Your Account is Ready!"
         
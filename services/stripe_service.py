@@ -1,21 +1,31 @@
+import asyncio
 import stripe
+from functools import partial
 from typing import Dict, Any
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from config import settings
-from database import db_service
-import uuid
+from database import db_service, new_id
 
 class StripeService:
     """Stripe payment service"""
     
     def __init__(self):
+        # The Stripe SDK is blocking; its HTTPS calls run on a small dedicated
+        # pool so a slow Stripe API can't stall the event loop or other executors
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stripe")
         if settings.stripe_secret_key:
             stripe.api_key = settings.stripe_secret_key
             print("✅ Stripe initialized")
         else:
             print("⚠️ Stripe secret key not configured")
     
-    def create_checkout_session(self, plan: str, success_url: str, cancel_url: str):
+    async def stripe_call(self, fn, *args, **kwargs):
+        """Run a blocking Stripe SDK call on the Stripe thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+    
+    async def create_checkout_session(self, plan: str, success_url: str, cancel_url: str):
         """Create Stripe checkout session with 14-day trial"""
         from config import PRICING_PLANS
         
@@ -25,7 +35,8 @@ class StripeService:
         plan_info = PRICING_PLANS[plan]
         
         try:
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await self.stripe_call(
+                stripe.checkout.Session.create,
                 payment_method_types=['card'],
                 line_items=[{
                     'price_data': {
@@ -56,7 +67,8 @@ class StripeService:
     async def handle_successful_payment(self, session_id: str) -> Dict[str, Any]:
         """Handle successful payment/trial signup"""
         
-        session = stripe.checkout.Session.retrieve(
+        session = await self.stripe_call(
+            stripe.checkout.Session.retrieve,
             session_id,
             expand=['customer', 'subscription']
         )
@@ -73,8 +85,9 @@ class StripeService:
         
         # Create customer in database
         from config import PRICING_PLANS
-        customer_id = str(uuid.uuid4())
+        customer_id = new_id()
         plan_info = PRICING_PLANS[plan]
+        now = datetime.now()
         
         await db_service.execute_query('''
             INSERT INTO customers (
@@ -84,7 +97,7 @@ class StripeService:
         ''', (
             customer_id, customer_email, str(session.customer),
             str(session.subscription), plan, api_key,
-            plan_info['leads_limit'], 'active', datetime.now(), datetime.now()
+            plan_info['leads_limit'], 'active', now, now
         ))
         
         return {
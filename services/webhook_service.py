@@ -14,6 +14,10 @@ class ZapierWebhookService:
     
     def __init__(self):
         self.executor = ThreadPoolExecutor(max_workers=4)
+        # One session for every delivery, so repeat posts to Zapier reuse
+        # keep-alive connections instead of a new TCP + TLS handshake each time
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=4))
     
     async def send_to_zapier(self, webhook_url: str, lead_data: Dict[str, Any], 
                            retry_count: int = 3) -> bool:
@@ -42,7 +46,7 @@ class ZapierWebhookService:
         def make_request():
             for attempt in range(retry_count):
                 try:
-                    response = requests.post(
+                    response = self.session.post(
                         webhook_url,
                         json=zapier_payload,
                         headers={'Content-Type': 'application/json'},
@@ -50,10 +54,10 @@ class ZapierWebhookService:
                     )
                     
                     if response.status_code == 200:
-                        logger.info(f"✅ Lead sent to Zapier: {lead_data.get('email')}")
+                        logger.info("✅ Lead sent to Zapier: %s", lead_data.get('email'))
                         return True
                     else:
-                        logger.warning(f"Zapier webhook failed: {response.status_code}")
+                        logger.warning("Zapier webhook failed: %s", response.status_code)
                         
                 except Exception as e:
                     logger.error(f"Zapier webhook error (attempt {attempt + 1}): {str(e)}")